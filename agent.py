@@ -2,10 +2,22 @@
 # Default LLM backend: Ollama (local, free). Swap call_llm() to use OpenAI/Claude if you want.
 
 import asyncio
-import json
+import hashlib
+import itertools
+import re
 import sys
-from typing import Dict, Any
-import requests  # used for Ollama; remove if you switch providers
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+import numpy as np
+import orjson
+import httpx  # used for Ollama; remove if you switch providers
+
+try:
+    import uvloop  # optional: libuv-based event loop, faster stdio/HTTP turnarounds
+except ImportError:
+    uvloop = None
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -17,7 +29,14 @@ from mcp.client.stdio import stdio_client
 
 OLLAMA_MODEL = "llama3.1"  # change to what you have locally
 
-def call_llm(system: str, user: str) -> str:
+# One pooled keep-alive async client for every turn: the TCP handshake happens once
+# and awaiting the reply no longer blocks the event loop.
+_HTTPX = httpx.AsyncClient(
+    timeout=httpx.Timeout(120.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16, keepalive_expiry=30.0),
+)
+
+async def call_llm(system: str, user: str) -> str:
     """
     Returns the LLM's raw text output. We instruct it to ONLY return JSON.
     Replace this with your preferred provider if needed.
@@ -29,14 +48,199 @@ def call_llm(system: str, user: str) -> str:
             {"role": "system", "content": system},
             {"role": "user", "content": user}
         ],
-        "stream": False,
+        "stream": True,
         "options": {"temperature": 0.2},
     }
-    r = requests.post(url, json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
-    # Ollama returns concatenated message content
-    return data.get("message", {}).get("content", "").strip()
+    parts = []
+    async with _HTTPX.stream("POST", url, json=payload) as r:
+        r.raise_for_status()
+        # Ollama streams one JSON chunk per line, each carrying a content delta
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            delta = chunk.get("message", {}).get("content", "")
+            parts.append(delta)
+            if chunk.get("done"):
+                break
+            # The plan is a single JSON object: stop once it parses and drop the rest,
+            # which closes the connection and frees Ollama's slot.
+            if "}" in delta:
+                text = "".join(parts).strip()
+                try:
+                    orjson.loads(text)
+                except orjson.JSONDecodeError:
+                    continue
+                return text
+    return "".join(parts).strip()
+
+
+# ---------- EXACT PROMPT CACHE ----------
+# Identical (system, user) prompts skip the LLM entirely. Persisted across runs.
+
+PROMPT_CACHE_PATH = Path.home() / ".cache" / "conv_agent" / "prompt_cache.json"
+PROMPT_CACHE_SIZE = 256
+
+def _prompt_key(system: str, user: str) -> str:
+    return hashlib.blake2b(f"{system}\0{user}".encode(), digest_size=16).hexdigest()
+
+
+def _load_prompt_cache() -> "OrderedDict[str, str]":
+    try:
+        return OrderedDict(orjson.loads(PROMPT_CACHE_PATH.read_bytes()))
+    except (OSError, ValueError):
+        return OrderedDict()
+
+
+_PROMPT_CACHE = _load_prompt_cache()
+
+def cached_reply(system: str, user: str) -> Optional[str]:
+    """Return the LLM reply previously stored for this exact prompt, if any."""
+    key = _prompt_key(system, user)
+    raw = _PROMPT_CACHE.get(key)
+    if raw is not None:
+        _PROMPT_CACHE.move_to_end(key)
+    return raw
+
+
+def remember_reply(system: str, user: str, raw: str) -> None:
+    """Store a (valid) LLM reply for this prompt, evicting the least recently used."""
+    _PROMPT_CACHE[_prompt_key(system, user)] = raw
+    while len(_PROMPT_CACHE) > PROMPT_CACHE_SIZE:
+        _PROMPT_CACHE.popitem(last=False)
+    try:
+        PROMPT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        PROMPT_CACHE_PATH.write_bytes(orjson.dumps(_PROMPT_CACHE))
+    except OSError:
+        pass  # cache is best-effort; a read-only home must not break the agent
+
+
+# ---------- SEMANTIC PLAN CACHE ----------
+# Paraphrased requests ("show summary" / "summarize the data") map to the same plan,
+# so we embed each user message and reuse the plan of a close-enough earlier request.
+
+OLLAMA_EMBED_MODEL = "nomic-embed-text"  # small, fast embedding model: `ollama pull nomic-embed-text`
+SEMANTIC_THRESHOLD = 0.92                # cosine similarity required to reuse a cached plan
+SEMANTIC_CACHE_SIZE = 512
+
+_EMBED_AVAILABLE = True  # cleared on the first failure so later turns skip the round trip
+
+async def embed(text: str) -> Optional[np.ndarray]:
+    """Unit-norm embedding of text, or None if the embedding model is unavailable."""
+    global _EMBED_AVAILABLE
+    if not _EMBED_AVAILABLE:
+        return None
+    url = "http://localhost:11434/api/embeddings"
+    try:
+        r = await _HTTPX.post(url, json={"model": OLLAMA_EMBED_MODEL, "prompt": text})
+        r.raise_for_status()
+    except httpx.HTTPError:
+        _EMBED_AVAILABLE = False  # e.g. model not pulled (404) or Ollama unreachable
+        return None
+    vec = np.asarray(orjson.loads(r.content).get("embedding") or [], dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else None
+
+
+FREE_TEXT_ARGS = {"path"}  # values the model can only copy from the user's words
+_NUMBER = re.compile(r"(?<![\d.])\d+(?:\.\d+)?(?!\.?\d)")
+
+
+def _arg_leaves(value, key=None):
+    """Yield (arg name, scalar) pairs of a plan's args; list items keep their arg's name."""
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _arg_leaves(v, k)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _arg_leaves(v, key)
+    else:
+        yield key, value
+
+
+def _states_number(value, text: str) -> bool:
+    """True if text states value as a whole number (10 is not "100", 3.0 is "3")."""
+    return any(float(m) == float(value) for m in _NUMBER.findall(text))
+
+
+def _contradicts(args, cached_msg: str, user_msg: str) -> bool:
+    """True if user_msg asks for something other than the cached plan's args.
+
+    Both messages are lower-cased. An arg only blocks reuse when the new message
+    disagrees with it, so bools and tool defaults the user never typed pass:
+    - free-text args (path) must appear in the new message;
+    - a number must be stated if the new message states any number, and must still
+      be stated if the original message stated it ("top 5" -> "top genres" misses);
+    - other strings (column names) must still appear if the original message had them;
+    - a bool is contradicted when the words of its name ("numeric", "only") are
+      mentioned in one message but not the other.
+    """
+    new_numbers = bool(_NUMBER.search(user_msg))
+    for key, value in _arg_leaves(args):
+        if isinstance(value, bool):
+            words = (key or "").lower().split("_")
+            if any((w in cached_msg) != (w in user_msg) for w in words if w):
+                return True
+        elif isinstance(value, (int, float)):
+            stated = _states_number(value, user_msg)
+            if not stated and (new_numbers or _states_number(value, cached_msg)):
+                return True
+        elif isinstance(value, str):
+            v = value.lower()
+            if key in FREE_TEXT_ARGS:
+                if v not in user_msg:
+                    return True
+            elif v in cached_msg and v not in user_msg:
+                return True
+    return False
+
+
+class SemanticCache:
+    """LRU cache of (embedding, plan, message) entries, searched by brute-force cosine similarity."""
+
+    def __init__(self, threshold: float = SEMANTIC_THRESHOLD, maxsize: int = SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._vecs: Optional[np.ndarray] = None  # (maxsize, dim) unit vectors
+        self._plans: list = []
+        self._msgs: list = []                    # lower-cased message that produced each plan
+        self._used: list = []                    # last-hit tick per slot, for LRU eviction
+        self._clock = itertools.count(1)
+
+    def lookup(self, vec: Optional[np.ndarray], user_msg: str) -> Optional[Dict[str, Any]]:
+        """Return the cached plan closest to vec, if similar enough and user_msg doesn't contradict it."""
+        if vec is None or not self._plans:
+            return None
+        sims = self._vecs[: len(self._plans)] @ vec
+        i = int(np.argmax(sims))
+        if sims[i] < self.threshold:
+            return None
+        # Paraphrases share a plan; "top 5 genres" vs "top 10 genres" do not.
+        plan = self._plans[i]
+        if _contradicts(plan.get("args") or {}, self._msgs[i], user_msg.lower()):
+            return None
+        self._used[i] = next(self._clock)
+        return plan
+
+    def add(self, vec: Optional[np.ndarray], plan: Dict[str, Any], user_msg: str) -> None:
+        if vec is None:
+            return
+        if self._vecs is None:
+            self._vecs = np.empty((self.maxsize, vec.size), dtype=np.float32)
+        if len(self._plans) < self.maxsize:
+            i = len(self._plans)
+            self._plans.append(plan)
+            self._msgs.append(user_msg.lower())
+            self._used.append(0)
+        else:
+            i = int(np.argmin(self._used))
+            self._plans[i] = plan
+            self._msgs[i] = user_msg.lower()
+        self._vecs[i] = vec
+        self._used[i] = next(self._clock)
+
+
+PLAN_CACHE = SemanticCache()
 
 
 # ---------- UTIL ----------
@@ -64,10 +268,40 @@ Rules:
 - Output strictly valid JSON. Do not include backticks or comments.
 """
 
+def to_json(obj) -> str:
+    """Indented JSON via orjson; numpy values and non-str keys are allowed."""
+    return orjson.dumps(
+        obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+
+def summarize_figures(obj):
+    """Replace Plotly specs under "figure"/"figures" with a one-line stub for printing."""
+    if not isinstance(obj, dict):
+        return obj
+    def stub(fig):
+        n = len(fig.get("data") or []) if isinstance(fig, dict) else 0
+        return f"<plotly figure, {n} traces>"
+    out = dict(obj)
+    if "figure" in out:
+        out["figure"] = stub(out["figure"])
+    if isinstance(out.get("figures"), dict):
+        out["figures"] = {k: stub(v) for k, v in out["figures"].items()}
+    return out
+
+
+def _text_as_json(text: str) -> str:
+    """Re-print a JSON text part with figures summarized; other text is left as is."""
+    try:
+        return to_json(summarize_figures(orjson.loads(text)))
+    except orjson.JSONDecodeError:
+        return text
+
+
 def dump_tool_result(r):
     """Print MCP result regardless of shape; keep concise."""
     if getattr(r, "structuredContent", None):
-        print(json.dumps(r.structuredContent, indent=2))
+        print(to_json(summarize_figures(r.structuredContent)))
         return
     parts = getattr(r, "content", []) or []
     if not parts:
@@ -78,90 +312,151 @@ def dump_tool_result(r):
     for i, p in enumerate(parts):
         t = getattr(p, "type", None)
         if t == "json":
-            print(json.dumps(p.data, indent=2))
+            print(to_json(summarize_figures(p.data)))
             printed = True
             break
     if not printed:
         # Fallback: print all text parts
         for i, p in enumerate(parts):
             if getattr(p, "type", None) == "text":
-                print(getattr(p, "text", ""))
+                print(_text_as_json(getattr(p, "text", "")))
+
+
+async def ainput(prompt: str = "") -> str:
+    """input() without blocking the event loop.
+
+    Reads on a daemon thread rather than the default executor, so Ctrl-C can exit
+    without waiting for the pending input() to return.
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def settle(line, exc):
+        if fut.done():
+            return
+        if exc is None:
+            fut.set_result(line)
+        else:
+            fut.set_exception(exc)
+
+    def read():
+        try:
+            line, exc = input(prompt), None
+        except BaseException as e:  # EOFError / KeyboardInterrupt surface in the awaiting task
+            line, exc = None, e
+        try:
+            loop.call_soon_threadsafe(settle, line, exc)
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await fut
 
 
 async def run_agent():
     # 1) Start MCP server
     params = StdioServerParameters(command="python", args=["server.py"])
 
-    async with stdio_client(params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
+    try:
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
 
-            # 2) Discover tools and feed to LLM as context
-            tools_resp = await session.list_tools()
-            tool_names = [t.name for t in tools_resp.tools]
+                # 2) Discover tools and feed to LLM as context
+                tools_resp = await session.list_tools()
+                tool_names = [t.name for t in tools_resp.tools]
 
-            print("✅ MCP connected. Tools available:")
-            for n in tool_names:
-                print(" -", n)
-            print("\nType your request (or 'exit'):")
+                print("✅ MCP connected. Tools available:")
+                for n in tool_names:
+                    print(" -", n)
+                print("\nType your request (or 'exit'):")
 
-            while True:
-                try:
-                    user_msg = input("\nYou: ").strip()
-                    if user_msg.lower() in ("exit", "quit"):
-                        print("👋 Bye.")
-                        break
-                    if not user_msg:
-                        continue
+                # Only the user's message varies per turn; the rest is built once.
+                system_prompt = (
+                    f"{AGENT_SYSTEM_PROMPT}\n"
+                    f"Available tools: [{', '.join(tool_names)}].\n"
+                )
 
-                    tool_list_str = ", ".join(tool_names)
-                    prompt_user = (
-                        f"Available tools: [{tool_list_str}].\n"
-                        f"User request: {user_msg}\n"
-                        f"Return only the JSON as specified."
-                    )
+                while True:
+                    try:
+                        user_msg = (await ainput("\nYou: ")).strip()
+                        if user_msg.lower() in ("exit", "quit"):
+                            print("👋 Bye.")
+                            break
+                        if not user_msg:
+                            continue
 
-                    # 3) Ask LLM to pick ONE tool + args as JSON
-                    raw = call_llm(AGENT_SYSTEM_PROMPT, prompt_user)
+                        prompt_user = (
+                            f"User request: {user_msg}\n"
+                            f"Return only the JSON as specified."
+                        )
 
-                    # 4) Parse LLM JSON
-                    try:
-                        plan = json.loads(raw)
-                    except json.JSONDecodeError:
-                        print("LLM did not return valid JSON. Raw:\n", raw)
-                        continue
+                        # 3) Reuse the reply to an identical prompt, else the plan of a paraphrase
+                        raw = cached_reply(system_prompt, prompt_user)
+                        cached = raw is not None
+                        vec = plan = None
+                        if not cached:
+                            vec = await embed(user_msg)
+                            plan = PLAN_CACHE.lookup(vec, user_msg)
+                            cached = plan is not None
+
+                        if plan is None:
+                            # 4) Ask LLM to pick ONE tool + args as JSON
+                            if raw is None:
+                                raw = await call_llm(system_prompt, prompt_user)
+                            try:
+                                plan = orjson.loads(raw)
+                            except orjson.JSONDecodeError:
+                                print("LLM did not return valid JSON. Raw:\n", raw)
+                                continue
+
+                        tool = plan.get("tool")
+                        args = plan.get("args", {}) or {}
 
-                    tool = plan.get("tool")
-                    args = plan.get("args", {}) or {}
+                        if tool not in tool_names:
+                            print(f"⚠️ LLM chose unknown tool: {tool}\nPlan:", plan)
+                            continue
 
-                    if tool not in tool_names:
-                        print(f"⚠️ LLM chose unknown tool: {tool}\nPlan:", plan)
-                        continue
+                        if not cached:
+                            remember_reply(system_prompt, prompt_user, raw)
+                            PLAN_CACHE.add(vec, plan, user_msg)
 
-                    print(f"\n🤖 LLM plan: call {tool} with args {args}")
-                    if plan.get("reason"):
-                        print("Reason:", plan["reason"])
+                        print(f"\n🤖 LLM plan{' (cached)' if cached else ''}: call {tool} with args {args}")
+                        if plan.get("reason"):
+                            print("Reason:", plan["reason"])
 
-                    # 5) Execute tool
-                    result = await session.call_tool(tool, arguments=args)
+                        # 5) Execute tool
+                        result = await session.call_tool(tool, arguments=args)
+
+                        # 6) Print result
+                        print("\n📦 Tool result:")
+                        dump_tool_result(result)
+
+                        # 7) Ask follow-up if LLM suggested one
+                        nxt = plan.get("next")
+                        if nxt:
+                            print("\n🤖 Next question:", nxt)
+
+                    except (KeyboardInterrupt, asyncio.CancelledError):
+                        print("\n👋 Bye.")
+                        break
 
-                    # 6) Print result
-                    print("\n📦 Tool result:")
-                    dump_tool_result(result)
+    finally:
+        await _HTTPX.aclose()
 
-                    # 7) Ask follow-up if LLM suggested one
-                    nxt = plan.get("next")
-                    if nxt:
-                        print("\n🤖 Next question:", nxt)
 
-                except KeyboardInterrupt:
-                    print("\n👋 Bye.")
-                    break
+def run(coro):
+    """Run a coroutine on uvloop when available, else on the stdlib asyncio loop."""
+    if uvloop is not None and sys.platform != "win32":
+        return uvloop.run(coro)
+    return asyncio.run(coro)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(run_agent())
+        run(run_agent())
+    except KeyboardInterrupt:
+        pass  # Ctrl-C while the loop was shutting down; we already said bye
     except RuntimeError as e:
         # If you're in Jupyter/IPython with a running loop:
         #   await run_agent()
@@ -1,14 +1,48 @@
 # client.py — interactive MCP client (fixed graceful exit)
 
 import asyncio
-import json
+import sys
+import threading
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+try:
+    import uvloop  # optional: libuv-based event loop, faster stdio turnarounds
+except ImportError:
+    uvloop = None
+
+def to_json(obj) -> str:
+    """Indented JSON via orjson; numpy values and non-str keys are allowed."""
+    return orjson.dumps(
+        obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+def summarize_figures(obj):
+    """Replace Plotly specs under "figure"/"figures" with a one-line stub for printing."""
+    if not isinstance(obj, dict):
+        return obj
+    def stub(fig):
+        n = len(fig.get("data") or []) if isinstance(fig, dict) else 0
+        return f"<plotly figure, {n} traces>"
+    out = dict(obj)
+    if "figure" in out:
+        out["figure"] = stub(out["figure"])
+    if isinstance(out.get("figures"), dict):
+        out["figures"] = {k: stub(v) for k, v in out["figures"].items()}
+    return out
+
+def _text_as_json(text: str) -> str:
+    """Re-print a JSON text part with figures summarized; other text is left as is."""
+    try:
+        return to_json(summarize_figures(orjson.loads(text)))
+    except orjson.JSONDecodeError:
+        return text
+
 def dump_tool_result(r):
     if getattr(r, "structuredContent", None):
         try:
-            print(json.dumps(r.structuredContent, indent=2))
+            print(to_json(summarize_figures(r.structuredContent)))
             return
         except Exception:
             pass
@@ -21,15 +55,45 @@ def dump_tool_result(r):
         if ptype == "json":
             try:
                 print(f"[part {i} json]")
-                print(json.dumps(p.data, indent=2))
+                print(to_json(summarize_figures(p.data)))
             except Exception as e:
                 print(f"[part {i} json](unprintable): {e}")
         elif ptype == "text":
             print(f"[part {i} text]")
-            print(getattr(p, "text", ""))
+            print(_text_as_json(getattr(p, "text", "")))
         else:
             print(f"[part {i} {ptype}] {p}")
 
+async def ainput(prompt: str = "") -> str:
+    """input() without blocking the event loop.
+
+    Reads on a daemon thread rather than the default executor, so Ctrl-C can exit
+    without waiting for the pending input() to return.
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def settle(line, exc):
+        if fut.done():
+            return
+        if exc is None:
+            fut.set_result(line)
+        else:
+            fut.set_exception(exc)
+
+    def read():
+        try:
+            line, exc = input(prompt), None
+        except BaseException as e:  # EOFError / KeyboardInterrupt surface in the awaiting task
+            line, exc = None, e
+        try:
+            loop.call_soon_threadsafe(settle, line, exc)
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await fut
+
 async def main():
     params = StdioServerParameters(command="python", args=["server.py"])
 
@@ -50,7 +114,7 @@ async def main():
 
             try:
                 while True:
-                    line = input(">>> ").strip()
+                    line = (await ainput(">>> ")).strip()
                     if not line:
                         continue
                     if line.lower() in ("exit", "quit"):
@@ -60,8 +124,8 @@ async def main():
                     if " " in line:
                         tool, json_part = line.split(" ", 1)
                         try:
-                            args = json.loads(json_part)
-                        except json.JSONDecodeError:
+                            args = orjson.loads(json_part)
+                        except orjson.JSONDecodeError:
                             print("❌ Invalid JSON. Example: tool_summary {\"numeric_only\": true}")
                             continue
                     else:
@@ -71,7 +135,7 @@ async def main():
                     res = await session.call_tool(tool, arguments=args)
                     dump_tool_result(res)
 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, asyncio.CancelledError):
                 print("\n👋 Exiting client.")
             finally:
                 # No session.shutdown() in this SDK; context manager will close it.
@@ -80,5 +144,14 @@ async def main():
                 except AttributeError:
                     pass  # safe to ignore; exiting 'async with' handles cleanup
 
+def run(coro):
+    """Run a coroutine on uvloop when available, else on the stdlib asyncio loop."""
+    if uvloop is not None and sys.platform != "win32":
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        run(main())
+    except KeyboardInterrupt:
+        pass  # Ctrl-C while the loop was shutting down
@@ -0,0 +1,20 @@
+# tools_aot.py — ahead-of-time build of the Numba kernels used by tools_core.py
+# Run once per machine/Python:  python tools_aot.py   (needs numba + a C compiler)
+# It writes tools_fast.*.so next to this file; tools_core imports it when present,
+# so the first outliers() call pays no JIT compile time and numba is not needed at runtime.
+
+from pathlib import Path
+
+from numba.pycc import CC
+
+from tools_core import _outlier_mask_loops
+
+cc = CC("tools_fast")
+cc.output_dir = str(Path(__file__).resolve().parent)
+
+# outliers() passes the cached float64 block from _numeric_block().
+# Correlations are not exported: np.corrcoef already runs on BLAS.
+cc.export("outlier_mask", "b1[:](f8[:,:], f8)")(_outlier_mask_loops)
+
+if __name__ == "__main__":
+    cc.compile()
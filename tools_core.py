@@ -1,12 +1,32 @@
 # tools_core.py — clean MCP-friendly data tools (no heuristics, JSON-safe returns)
 
+import os
+import orjson
 import pandas as pd
 import numpy as np
 import plotly.express as px
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Tuple, Any, Optional
 import warnings
 
+try:
+    from numba import njit, prange  # optional: fused JIT kernels for the numeric tools
+except ImportError:
+    njit, prange = None, range
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv  # optional: fast CSV parsing in load_data()
+except ImportError:
+    pa = pa_csv = None
+
+try:
+    import tools_fast  # optional: AOT build of the kernels below, see tools_aot.py
+except ImportError:
+    tools_fast = None
+
 # Silence pandas/plotly warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -16,9 +36,56 @@ STATE: Dict[str, Any] = {
     "df": None,       # active DataFrame
     "name": None,     # dataset name
     "schema": None,   # LLM-provided schema
+    "version": 0,     # bumped on every load; memoized tools key on it
+    # dtype partition, cached at load time (df only changes in load_data)
+    "numeric_cols": [],
+    "categorical_cols": [],
+    "datetime_cols": [],
+    "numeric_np": None,  # contiguous float64 block of numeric_cols, column-major
+    "numeric_nan": {},   # numeric column -> whether it has any NaN
 }
 
+# ---- Plot rendering ----
+# "json" (default): return the Plotly figure spec in the tool result for the client to draw.
+# "show": also open each figure in a browser, as fig.show() did before.
+RENDER_MODE = os.getenv("PLOT_MODE", "json")
+
+# fig.show() does browser plumbing; run it off the tool call so results return immediately.
+_PLOT_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="plot-show")
+
+def _render(fig) -> Dict[str, Any]:
+    """Return the figure as a JSON-safe Plotly spec (and show it if RENDER_MODE is 'show')."""
+    spec = orjson.loads(fig.to_json())  # plotly itself serialises with orjson when installed
+    if RENDER_MODE == "show":
+        _PLOT_POOL.submit(fig.show)  # fig is not touched after this point
+    return spec
+
+
 # ---- Data I/O ----
+def _read_csv(path: str) -> pd.DataFrame:
+    """Parse with pyarrow's multithreaded C reader, falling back to the default engine."""
+    try:
+        df = pd.read_csv(path, engine="pyarrow")
+        # pyarrow parses date/time text itself (shifting offsets to UTC, reformatting,
+        # leaving NaT in empty cells); re-read those columns unparsed to keep the text.
+        parsed = [
+            c for c in df.columns
+            if pd.api.types.is_datetime64_any_dtype(df[c])
+            or (df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True) in ("date", "time"))
+        ]
+        if parsed:
+            raw = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+                include_columns=parsed,
+                column_types={c: pa.string() for c in parsed},
+                strings_can_be_null=True,
+            ))
+            for c in parsed:
+                df[c] = raw.column(c).to_pandas()
+        return df
+    except Exception:
+        return pd.read_csv(path)  # pyarrow missing or this file needs the default parser
+
+
 def load_data(path: Optional[str] = None) -> Dict[str, Any]:
     """
     Load a CSV file. If no path is provided, it looks for a default file named 'dataset.csv'
@@ -31,9 +98,10 @@ def load_data(path: Optional[str] = None) -> Dict[str, Any]:
         path = str(default)
 
     try:
-        df = pd.read_csv(path)
-        STATE["df"] = df
-        STATE["name"] = Path(path).name
+        df = _read_csv(path)
+        partition = _dtype_partition(df)
+        # Commit everything together so a failure above leaves the previous dataset intact
+        STATE.update(partition, df=df, name=Path(path).name, version=STATE["version"] + 1)
         return {
             "ok": True,
             "dataset": STATE["name"],
@@ -45,6 +113,37 @@ def load_data(path: Optional[str] = None) -> Dict[str, Any]:
         return {"ok": False, "error": f"load_failed:{type(e).__name__}:{e}"}
 
 
+def _dtype_partition(df: pd.DataFrame) -> Dict[str, Any]:
+    """Split columns by dtype once and keep the numeric ones as one float64 block."""
+    numeric = df.select_dtypes(include=np.number).columns.tolist()
+    block = np.asfortranarray(df[numeric].to_numpy(dtype=np.float64, na_value=np.nan))
+    return {
+        "numeric_cols": numeric,
+        "categorical_cols": df.select_dtypes(include=["object", "string", "category"]).columns.tolist(),
+        "datetime_cols": df.select_dtypes(include=["datetime", "datetimetz"]).columns.tolist(),
+        "numeric_np": block,
+        "numeric_nan": dict(zip(numeric, np.isnan(block).any(axis=0).tolist())),
+    }
+
+
+def _numeric_block(columns: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+    """Numeric subset of columns (all numeric if None) and its slice of the cached block."""
+    cols, X = STATE["numeric_cols"], STATE["numeric_np"]
+    if columns is None:
+        return cols, X
+    unknown = [c for c in columns if c not in STATE["df"].columns]
+    if unknown:
+        raise KeyError(unknown)
+    pos = {c: i for i, c in enumerate(cols)}
+    keep = [c for c in columns if c in pos]
+    return keep, X[:, [pos[c] for c in keep]]
+
+
+def _as_float32(X: np.ndarray) -> np.ndarray:
+    """A _numeric_block() downcast to float32 for np.corrcoef: half the bytes through BLAS."""
+    return X.astype(np.float32, order="F")
+
+
 def set_schema(schema: Dict[str, List[str]]) -> Dict[str, Any]:
     """Store the schema provided by the LLM."""
     STATE["schema"] = schema
@@ -57,22 +156,54 @@ def get_schema() -> Dict[str, Any]:
 
 
 # ---- Summaries ----
+def _describe_block(cols: List[str], X: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """describe().T.to_dict() of the numeric block, from one numpy reduction per stat."""
+    if any(STATE["numeric_nan"][c] for c in cols):
+        mean, std, lo, hi, pct = np.nanmean, np.nanstd, np.nanmin, np.nanmax, np.nanpercentile
+        count = (~np.isnan(X)).sum(axis=0)
+    else:
+        mean, std, lo, hi, pct = np.mean, np.std, np.min, np.max, np.percentile
+        count = np.full(len(cols), len(X))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN / single-value column -> NaN
+        q = pct(X, [25, 50, 75], axis=0)
+        stats = {
+            "count": count,
+            "mean": mean(X, axis=0),
+            "std": std(X, axis=0, ddof=1),
+            "min": lo(X, axis=0),
+            "25%": q[0],
+            "50%": q[1],
+            "75%": q[2],
+            "max": hi(X, axis=0),
+        }
+    return {k: dict(zip(cols, v.astype(float).tolist())) for k, v in stats.items()}
+
+
 def summary(numeric_only: bool = True) -> Dict[str, Any]:
     """Return dataset size and describe() summary."""
-    df = STATE["df"]
-    if df is None:
+    if STATE["df"] is None:
         return {"ok": False, "error": "no_dataset_loaded"}
+    return _summary(STATE["version"], bool(numeric_only))
+
 
+@lru_cache(maxsize=32)
+def _summary(version: int, numeric_only: bool) -> Dict[str, Any]:
+    """summary() for one dataset version; reloading bumps the version, so no stale hits."""
+    df = STATE["df"]
     try:
-        if numeric_only:
-            desc = df.describe().T
+        cols, X = _numeric_block()
+        if numeric_only and cols and len(X):
+            desc = _describe_block(cols, X)
+        elif numeric_only:
+            desc = df.describe().T.to_dict()  # no numeric data: let pandas describe the rest
         else:
-            desc = df.describe(include="all").T
+            desc = df.describe(include="all").T.to_dict()  # ✅ convert DataFrame → dict
         return {
             "ok": True,
             "rows": len(df),
             "cols": df.shape[1],
-            "describe": desc.to_dict(),  # ✅ convert DataFrame → dict
+            "describe": desc,
         }
     except Exception as e:
         return {"ok": False, "error": f"summary_failed:{type(e).__name__}:{e}"}
@@ -87,40 +218,66 @@ def head(n: int = 5) -> Dict[str, Any]:
 
 
 # ---- Categorical (LLM decides which columns) ----
+@lru_cache(maxsize=64)
+def _top_counts(version: int, column: str, top_n: int) -> Dict[str, int]:
+    """Top-n value counts of one column for one dataset version."""
+    # Count the native values with pandas' hashtable; only the top_n labels
+    # are stringified, instead of one str() per row.
+    counts = STATE["df"][column].value_counts(dropna=True)
+    counts = counts[counts > 0].head(top_n)  # drop unobserved categories
+    counts.index = counts.index.astype(str)
+    return counts.to_dict()
+
+
 def top_categories(columns: List[str], top_n: int = 10) -> Dict[str, Any]:
     df = STATE["df"]
     if df is None:
         return {"ok": False, "error": "no_dataset_loaded"}
 
     out = {}
+    figures = {}
     for c in columns:
         try:
-            counts = df[c].astype(str).value_counts(dropna=True).head(top_n)
-            out[c] = counts.to_dict()
+            out[c] = _top_counts(STATE["version"], c, top_n)
             fig = px.bar(
                 x=list(out[c].keys()),
                 y=list(out[c].values()),
                 title=f"Top {top_n}: {c}",
             )
             fig.update_layout(xaxis_tickangle=-30)
-            fig.show()
+            figures[c] = _render(fig)
         except Exception as e:
             out[c] = f"error:{e}"
 
-    return {"ok": True, "top_categories": out}
+    return {"ok": True, "top_categories": out, "figures": figures}
 
 
 # ---- Correlations (LLM supplies the exact columns or pairs) ----
 def correlations(columns: Optional[List[str]] = None, method: str = "pearson") -> Dict[str, Any]:
-    df = STATE["df"]
-    if df is None:
+    if STATE["df"] is None:
         return {"ok": False, "error": "no_dataset_loaded"}
+    key_cols = tuple(columns) if columns is not None else None
+    return _correlations(STATE["version"], key_cols, method)
 
+
+@lru_cache(maxsize=32)
+def _correlations(version: int, columns: Optional[Tuple[str, ...]], method: str) -> Dict[str, Any]:
+    """correlations() for one dataset version."""
+    if columns is not None:
+        columns = list(columns)
     try:
-        if columns is None:
-            corr = df.corr(numeric_only=True, method=method)
+        cols, X = _numeric_block(columns)
+        has_nan = STATE["numeric_nan"]
+        if method == "pearson" and len(cols) > 1 and not any(has_nan[c] for c in cols):
+            # One BLAS-backed pass over the contiguous block (float32, see _as_float32)
+            with np.errstate(divide="ignore", invalid="ignore"):  # constant column -> NaN, as pandas
+                C = np.corrcoef(_as_float32(X), rowvar=False, dtype=np.float32)
+            d = np.diag_indices_from(C)
+            C[d] = np.where(np.isnan(C[d]), np.nan, 1.0)  # float32 rounding leaves 0.9999999
+            corr = pd.DataFrame(C, index=cols, columns=cols)
         else:
-            corr = df[columns].corr(method=method)
+            # pandas handles NaNs pairwise and the spearman/kendall rank methods (float64)
+            corr = pd.DataFrame(X, columns=cols, copy=False).corr(method=method)
         return {"ok": True, "method": method, "corr": corr.to_dict()}
     except Exception as e:
         return {"ok": False, "error": f"correlation_failed:{e}"}
@@ -132,27 +289,77 @@ def scatter_pairs(pairs: List[Tuple[str, str]]) -> Dict[str, Any]:
         return {"ok": False, "error": "no_dataset_loaded"}
 
     rendered = []
+    figures = {}
     for x, y in pairs:
         try:
             fig = px.scatter(df, x=x, y=y, trendline="ols", title=f"{x} vs {y}")
-            fig.show()
+            figures[f"{x}_vs_{y}"] = _render(fig)
             rendered.append(f"{x}_vs_{y}")
         except Exception as e:
             rendered.append(f"{x}_vs_{y}_error:{e}")
 
-    return {"ok": True, "pairs_rendered": rendered}
+    return {"ok": True, "pairs_rendered": rendered, "figures": figures}
 
 
 # ---- Outliers (LLM chooses columns & threshold) ----
+def _outlier_mask_loops(X: np.ndarray, z: float) -> np.ndarray:
+    """Rows where any column has |z-score| > z (population std, NaNs ignored), as plain loops.
+
+    Mean and variance come from one Welford pass per column, so each column is read
+    twice (stats, then threshold) rather than three times.
+    """
+    n, m = X.shape
+    mask = np.zeros(n, dtype=np.bool_)
+    for j in prange(m):
+        k = 0
+        mu = 0.0
+        M2 = 0.0
+        for i in range(n):
+            x = X[i, j]
+            if x == x:
+                k += 1
+                d = x - mu
+                mu += d / k
+                M2 += d * (x - mu)
+        if k == 0:
+            continue
+        sd = (M2 / k) ** 0.5 + 1e-9
+        for i in range(n):
+            if abs(X[i, j] - mu) / sd > z:
+                mask[i] = True
+    return mask
+
+
+def _outlier_mask_numpy(X: np.ndarray, z: float) -> np.ndarray:
+    """Vectorised fallback used when neither tools_fast nor numba is available."""
+    with np.errstate(invalid="ignore"):
+        # float64 accumulators, like the kernel
+        mu = np.nanmean(X, axis=0, dtype=np.float64)
+        zscores = (X - mu) / (np.nanstd(X, axis=0, dtype=np.float64) + 1e-9)
+        return (np.abs(zscores) > z).any(axis=1)
+
+
+# Prefer the AOT build (no compile on first call), then the JIT, then numpy.
+# No fastmath: it assumes NaN-free input and would drop the x == x checks.
+if tools_fast is not None:
+    def _outlier_mask(X: np.ndarray, z: float) -> np.ndarray:
+        """AOT kernel; its f8[:,:] signature is not checked at runtime, so cast here."""
+        return tools_fast.outlier_mask(np.asarray(X, dtype=np.float64), float(z))
+elif njit is not None:
+    _outlier_mask = njit(parallel=True, cache=True)(_outlier_mask_loops)
+else:
+    _outlier_mask = _outlier_mask_numpy
+
+
 def outliers(columns: List[str], z: float = 3.0) -> Dict[str, Any]:
     df = STATE["df"]
     if df is None:
         return {"ok": False, "error": "no_dataset_loaded"}
 
     try:
-        sub = df[columns].select_dtypes(include=np.number)
-        zscores = (sub - sub.mean()) / (sub.std(ddof=0) + 1e-9)
-        mask = (zscores.abs() > z).any(axis=1)
+        # The cached float64 block as-is: a float32 copy costs more than the kernel saves
+        _, X = _numeric_block(columns)
+        mask = _outlier_mask(X, float(z))
         indices = df.index[mask].tolist()
         return {"ok": True, "count": len(indices), "indices": indices}
     except Exception as e:
@@ -160,12 +367,18 @@ def outliers(columns: List[str], z: float = 3.0) -> Dict[str, Any]:
 
 
 # ---- Missing values (LLM supplies threshold) ----
+@lru_cache(maxsize=8)
+def _missing_rate(version: int) -> pd.Series:
+    """Per-column fraction of missing values for one dataset version."""
+    return STATE["df"].isna().mean()
+
+
 def missing(threshold: float = 0.20) -> Dict[str, Any]:
     df = STATE["df"]
     if df is None:
         return {"ok": False, "error": "no_dataset_loaded"}
 
-    miss = df.isna().mean()
+    miss = _missing_rate(STATE["version"])
     flagged = miss[miss > threshold].sort_values(ascending=False)
     return {
         "ok": True,
@@ -182,8 +395,7 @@ def plot_hist(column: str, nbins: int = 30) -> Dict[str, Any]:
 
     try:
         fig = px.histogram(df, x=column, nbins=nbins, title=f"Distribution: {column}")
-        fig.show()
-        return {"ok": True}
+        return {"ok": True, "figure": _render(fig)}
     except Exception as e:
         return {"ok": False, "error": f"plot_hist_failed:{e}"}
 
@@ -195,13 +407,24 @@ def plot_xy(x: str, y: str) -> Dict[str, Any]:
 
     try:
         fig = px.scatter(df, x=x, y=y, trendline="ols", title=f"{x} vs {y}")
-        fig.show()
-        return {"ok": True}
+        return {"ok": True, "figure": _render(fig)}
     except Exception as e:
         return {"ok": False, "error": f"plot_xy_failed:{e}"}
 
 
 # ---- Time trends ----
+def _count_ints(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct ints and their counts; np.bincount when the value range is compact."""
+    if not len(v):
+        return v, v
+    lo = v.min()
+    if v.max() - lo <= 4 * len(v) + 1024:  # keeps the bincount array small
+        counts = np.bincount(v - lo)
+        keys = np.flatnonzero(counts)
+        return keys + lo, counts[keys]
+    return np.unique(v, return_counts=True)
+
+
 def time_trend(column: str, freq: str = "M") -> Dict[str, Any]:
     df = STATE["df"]
     if df is None:
@@ -211,27 +434,39 @@ def time_trend(column: str, freq: str = "M") -> Dict[str, Any]:
 
     try:
         if pd.api.types.is_datetime64_any_dtype(s):
-            grp = s.dropna().dt.to_period(freq).value_counts().sort_index()
-            result = grp.to_dict()
+            if freq in ("Y", "M"):
+                # Integer year / month keys counted directly, no Period index
+                dt = s.dropna().dt
+                key = dt.year.to_numpy(dtype=np.int64)
+                if freq == "M":
+                    key = key * 12 + dt.month.to_numpy(dtype=np.int64) - 1
+                uniq, counts = _count_ints(key)
+                if freq == "Y":
+                    labels = [f"{k:04d}" for k in uniq.tolist()]
+                else:
+                    labels = [f"{k // 12:04d}-{k % 12 + 1:02d}" for k in uniq.tolist()]
+                result = dict(zip(labels, counts.tolist()))
+            else:
+                grp = s.dropna().dt.to_period(freq).value_counts().sort_index()
+                result = {str(k): v for k, v in grp.to_dict().items()}  # same labels as above
             fig = px.line(
                 x=list(result.keys()),
                 y=list(result.values()),
                 labels={"x": column, "y": "count"},
                 title=f"Count by {freq}: {column}",
             )
-            fig.show()
-            return {"ok": True, "type": "datetime", "trend": result}
+            return {"ok": True, "type": "datetime", "trend": result, "figure": _render(fig)}
 
-        ser = pd.to_numeric(s, errors="coerce").dropna().astype(int)
-        grp = ser.value_counts().sort_index()
-        result = grp.to_dict()
+        # pandas astype is strict: inf raises (time_trend_failed) instead of wrapping to INT64_MIN
+        years = pd.to_numeric(s, errors="coerce").dropna().astype(np.int64).to_numpy()
+        uniq, counts = _count_ints(years)
+        result = dict(zip(uniq.tolist(), counts.tolist()))
         fig = px.line(
             x=list(result.keys()),
             y=list(result.values()),
             labels={"x": column, "y": "count"},
             title=f"Count by Year: {column}",
         )
-        fig.show()
-        return {"ok": True, "type": "year-int", "trend": result}
+        return {"ok": True, "type": "year-int", "trend": result, "figure": _render(fig)}
     except Exception as e:
         return {"ok": False, "error": f"time_trend_failed:{e}"}